@@ -1,17 +1,26 @@
-import requests
+import httpx
+import asyncio
 import json
+import orjson
+import os
 import re
+import shelve
 import time
 import csv
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack
+from urllib.parse import urlencode
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
 
 # Load configuration
-with open('config.json') as config_file:
-    config = json.load(config_file)
+with open('config.json', 'rb') as config_file:
+    config = orjson.loads(config_file.read())
 
 GITHUB_TOKEN = config['github_token']
 ORG_NAME = config['org_name']
-COMPLIANT_IMAGES = config['complioant_images']
+COMPLIANT_IMAGES = frozenset(config['compliant_images'])
 GRAPHQL_QUERY = config['graphql_query']
 
 HEADERS = {
@@ -19,142 +28,299 @@ HEADERS = {
     'Content-Type': 'application/json'
 }
 
+# Stage names that refer to an earlier build stage rather than a pulled image
+MULTISTAGE_NAMES = frozenset({'base', 'build', 'final', 'builder'})
+
+# Placeholder image names that are counted but never reported as compliant or non-compliant
+SKIP_NAMES = frozenset({'base', 'final', 'builder', 'amd64', 'arm64'})
+
 GRAPHQL_URL = "https://api.github.com/graphql"
 API_URL = "https://api.github.com"
 
+# Seconds to wait on a single GitHub request; batched GraphQL queries can be slow
+REQUEST_TIMEOUT = 60
+
+# Ask the contents API for the raw file instead of JSON metadata plus a download_url
+RAW_HEADERS = {'Accept': 'application/vnd.github.raw'}
+
+# ARG defaults (groups 1 and 2) and FROM images (group 3) in a Dockerfile
+DOCKERFILE_RE = re.compile(r'^\s*(?:ARG\s+([A-Z_]+)=(\S+)|FROM\s+(\S+))', re.MULTILINE)
+
+# Files worth scanning for images: matched by name, or by living under a CI directory
+PIPELINE_FILE_SUFFIXES = ('docker-compose.yml', 'docker-compose.yaml', '.gitlab-ci.yml', 'pipeline')
+PIPELINE_DIR_HINTS = ('.github/workflows/', '.concourse/')
+
+# Top-level directories whose subtrees are fetched to look for PIPELINE_DIR_HINTS files
+PIPELINE_ROOT_DIRS = frozenset(hint.split('/')[0] for hint in PIPELINE_DIR_HINTS)
+
+# ${ARG} references inside an image name
+PARAM_RE = re.compile(r'\$\{([A-Z_]+)\}')
+
+# Image references in docker-compose and CI files; exactly one named group matches
+PIPELINE_RE = re.compile(
+    r'(?i)image:\s*(?P<image>\S+)'
+    r'|services:\s*-\s*name:\s*(?P<service>\S+)'
+    r'|repository:\s*(?P<repository>\S+)'
+)
+
+# Fields fetched for every repository alias in the batched details query
+REPO_DETAILS_FIELDS = """
+    dockerfile: object(expression: "HEAD:Dockerfile") { ... on Blob { text } }
+    tree: object(expression: "HEAD:") { ... on Tree { entries { name type oid } } }
+    defaultBranchRef {
+        target { ... on Commit { history(first: 100) { nodes { author { name } } } } }
+    }
+"""
+
+# Node budget for one batched details query and the estimated cost of one repository alias
+MAX_QUERY_NODES = 2000
+REPO_QUERY_NODES = 102
+REPOS_PER_QUERY = MAX_QUERY_NODES // REPO_QUERY_NODES
+
+# Cap in-flight GitHub requests to stay under the secondary rate limits
+GH_SEM = asyncio.Semaphore(20)
+
+# Stop paging through repositories once any rate limit bucket drops below this many calls
+RATE_LIMIT_THRESHOLD = 100
+
+# Shared rate limit state so a single 403/429 pauses every request, plus the
+# remaining calls per rate limit resource (core, graphql, ...) from the latest response headers
+rate_limit_state = {
+    "paused_until": 0.0,
+    "remaining": {},
+}
+
 # Global variable to store statistics
 stats = {
     "total_repos": 0,
     "total_images": 0,
-    "image_counts": defaultdict(int),
-    "compliant_counts": defaultdict(int),
+    "image_counts": Counter(),
+    "compliant_counts": Counter(),
 }
 
 build_pipeline_stats = {
     "total_pipeline_images": 0,
-    "pipeline_image_counts": defaultdict(int)
+    "pipeline_image_counts": Counter()
 }
 
-compliant_images_data = []
-non_compliant_images_data = []
-build_pipeline_images_data = []
-
-def check_rate_limit():
-    """Check the current GitHub API rate limit status."""
-    url = "https://api.github.com/rate_limit"
-    headers = {'Authorization': f'bearer {GITHUB_TOKEN}'}
-    
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        rate_limit_data = response.json()
-        remaining = rate_limit_data['rate']['remaining']
-        reset_time = rate_limit_data['rate']['reset']
-        reset_time_human_readable = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reset_time))
-
-        print(f"API calls remaining: {remaining}")
-        if remaining == 0:
-            print(f"Rate limit exceeded. Resets at: {reset_time_human_readable}")
-        return remaining
-    else:
-        print(f"Failed to check rate limit: {response.status_code}")
-        return None
-
-def run_query(query, variables):
-    """Run a GraphQL query and return the result with retry logic."""
+# Report CSVs as (label, path, header); rows are streamed in as each page of repositories finishes
+REPORTS = {
+    "compliant": ("Compliant images", "compliant_images.csv", ["Repo name", "Repo branch", "Image name"]),
+    "non_compliant": ("Non-compliant images", "non_compliant_images.csv",
+                      ["Repo name", "Repo branch", "Image name", "Top Contributors", "Image path"]),
+    "pipeline": ("Build pipeline images", "build_pipeline_images.csv",
+                 ["Repo name", "Repo branch", "Image name", "File path"]),
+}
+REPORT_BUFFER_SIZE = 1 << 20
+
+# CSV writers keyed like REPORTS, opened by open_reports()
+report_writers = {}
+
+# Top contributors keyed by (repo_name, branch_name)
+contributors_cache = {}
+
+# On-disk (etag, body) cache of GitHub GET responses, opened by main() for the duration of a run
+ETAG_CACHE_PATH = 'gh_cache'
+etag_cache = None
+
+# Process pool for Dockerfile and pipeline file parsing, opened by main() for the duration of a run
+parse_pool = None
+
+@dataclass
+class RepoResult:
+    """Images found while processing one repository, merged into the run totals by the driver."""
+    compliant: list = field(default_factory=list)
+    non_compliant: list = field(default_factory=list)
+    pipeline: list = field(default_factory=list)
+    image_counts: Counter = field(default_factory=Counter)
+    compliant_counts: Counter = field(default_factory=Counter)
+    pipeline_image_counts: Counter = field(default_factory=Counter)
+
+    def merge(self, other):
+        """Add the images and counts of another result to this one."""
+        self.compliant.extend(other.compliant)
+        self.non_compliant.extend(other.non_compliant)
+        self.pipeline.extend(other.pipeline)
+        self.image_counts.update(other.image_counts)
+        self.compliant_counts.update(other.compliant_counts)
+        self.pipeline_image_counts.update(other.pipeline_image_counts)
+
+async def gh_request(client, method, url, as_text=False, cache_key=None, **kwargs):
+    """Send a GitHub request bounded by GH_SEM, retrying on rate limits and server errors."""
     max_retries = 5
     initial_wait_time = 5  # Start with a 5-second wait time
     backoff_factor = 2
-    
+    status_code = None
+
+    # Revalidate cached responses; a 304 does not count against the rate limit
+    cached = etag_cache.get(cache_key) if etag_cache is not None and cache_key else None
+    if cached:
+        kwargs['headers'] = {**kwargs.get('headers', {}), 'If-None-Match': cached[0]}
+
     for attempt in range(max_retries):
+        wait_time = initial_wait_time * (backoff_factor ** attempt)
         try:
-            request = requests.post(GRAPHQL_URL, json={'query': query, 'variables': variables}, headers=HEADERS)
-            if request.status_code == 200:
-                return request.json()
-            
-            elif request.status_code == 502:
-                wait_time = initial_wait_time * (backoff_factor ** attempt)
-                print(f"502 Bad Gateway error: Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
+            async with GH_SEM:
+                # Hold off while another request is waiting out a rate limit
+                pause = rate_limit_state["paused_until"] - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+
+                response = await client.request(method, url, **kwargs)
+
+            status_code = response.status_code
+            if 'X-RateLimit-Remaining' in response.headers:
+                resource = response.headers.get('X-RateLimit-Resource', 'core')
+                rate_limit_state["remaining"][resource] = int(response.headers['X-RateLimit-Remaining'])
+
+            if response.status_code == 200:
+                body = response.text if as_text else orjson.loads(response.content)
+                etag = response.headers.get('ETag')
+                if etag and cache_key and etag_cache is not None:
+                    etag_cache[cache_key] = (etag, body)
+                return body
+            elif response.status_code == 304 and cached:
+                return cached[1]
+
+            retry_after = response.headers.get('Retry-After')
+            exhausted = response.headers.get('X-RateLimit-Remaining') == '0'
+            if response.status_code in (403, 429) and (retry_after is not None or exhausted):
+                if retry_after is not None:
+                    wait_time = int(retry_after)
+                else:
+                    wait_time = max(int(response.headers['X-RateLimit-Reset']) - int(time.time()), 1)
+                rate_limit_state["paused_until"] = time.monotonic() + wait_time
+                print(f"Rate limited by GitHub: Pausing requests for {wait_time} seconds...")
+            elif response.status_code >= 500:
+                print(f"{response.status_code} server error: Retrying in {wait_time} seconds...")
             else:
-                request.raise_for_status()  # Raise an HTTPError for other 4xx/5xx responses
-        except requests.exceptions.HTTPError as http_err:
-            raise requests.exceptions.HTTPError(
-                f"HTTP error occurred during GraphQL query: {http_err}, Status code: {request.status_code}, Query: {query}"
-            ) from http_err
-        except Exception as e:
-            print(f"Exception occurred during query: {e}")
+                response.raise_for_status()  # Raise an HTTPStatusError for other 4xx responses
+        except httpx.TransportError as e:
+            print(f"Exception occurred during request to {url}: {e}")
             if attempt == max_retries - 1:
                 raise  # Re-raise the last exception if max retries reached
 
-    raise requests.exceptions.RequestException(f"Max retries exceeded. Last response code: {request.status_code}")
+        await asyncio.sleep(wait_time)
+
+    raise httpx.HTTPError(f"Max retries exceeded for {url}. Last response code: {status_code}")
+
+async def gh_get(client, url, as_text=False, **kwargs):
+    """Send a GET request to GitHub through gh_request, cached by URL and ETag."""
+    params = urlencode(sorted((kwargs.get('params') or {}).items()))
+    accept = (kwargs.get('headers') or {}).get('Accept', '')
+    cache_key = f"{accept} {url}?{params}"
+    return await gh_request(client, 'GET', url, as_text=as_text, cache_key=cache_key, **kwargs)
 
-def get_dockerfile_content(repo_name, branch_name):
+async def check_rate_limit(client):
+    """Check the current GitHub API rate limit status."""
+    url = f"{API_URL}/rate_limit"
+
+    try:
+        rate_limit_data = await gh_request(client, 'GET', url)  # Never served from the ETag cache
+    except httpx.HTTPError as e:
+        print(f"Failed to check rate limit: {e}")
+        return None
+
+    remaining = rate_limit_data['rate']['remaining']
+    reset_time = rate_limit_data['rate']['reset']
+    reset_time_human_readable = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reset_time))
+
+    print(f"API calls remaining: {remaining}")
+    if remaining == 0:
+        print(f"Rate limit exceeded. Resets at: {reset_time_human_readable}")
+    return remaining
+
+async def run_query(client, query, variables):
+    """Run a GraphQL query and return the result with retry logic."""
+    try:
+        return await gh_request(client, 'POST', GRAPHQL_URL, json={'query': query, 'variables': variables})
+    except httpx.HTTPStatusError as http_err:
+        raise httpx.HTTPStatusError(
+            f"HTTP error occurred during GraphQL query: {http_err}, Status code: {http_err.response.status_code}, Query: {query}",
+            request=http_err.request,
+            response=http_err.response
+        ) from http_err
+
+async def get_dockerfile_content(client, repo_name, branch_name):
     """Fetch the content of Dockerfiles from the default branch of a repository."""
     url = f"{API_URL}/repos/{ORG_NAME}/{repo_name}/contents/"
-    headers = {'Authorization': f'bearer {GITHUB_TOKEN}'}
     params = {'ref': branch_name}
-    
+
     try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx, 5xx)
-        files = response.json()
+        try:
+            return await gh_get(client, f"{url}Dockerfile", as_text=True, headers=RAW_HEADERS, params=params)
+        except httpx.HTTPStatusError as http_err:
+            if http_err.response.status_code != 404:
+                raise
+
+        # No exact "Dockerfile"; list the root for other spellings such as dockerfile or Dockerfile.prod
+        files = await gh_get(client, url, params=params)
         for file in files:
             if file['name'].lower().startswith('dockerfile'):
-                dockerfile_response = requests.get(file['download_url'], headers=headers)
-                dockerfile_response.raise_for_status()  # Raise an error for bad responses
-                return dockerfile_response.text
-    except requests.exceptions.HTTPError as http_err:
+                return await gh_get(client, f"{url}{file['name']}", as_text=True, headers=RAW_HEADERS, params=params)
+    except httpx.HTTPStatusError as http_err:
         print(f"Failed to fetch files for repo: {repo_name}, branch: {branch_name} - HTTP error occurred: {http_err}")
-    except requests.exceptions.RequestException as req_err:
+    except httpx.HTTPError as req_err:
         print(f"Failed to fetch files for repo: {repo_name}, branch: {branch_name} - Request error occurred: {req_err}")
     except Exception as e:
         print(f"Failed to fetch files for repo: {repo_name}, branch: {branch_name} - Unexpected error: {e}")
 
     return None
 
-def get_file_content(repo_name, branch_name, file_path):
+async def get_file_content(client, repo_name, branch_name, file_path):
     """Fetch the content of specific files in the repository."""
     url = f"{API_URL}/repos/{ORG_NAME}/{repo_name}/contents/{file_path}"
-    headers = {'Authorization': f'bearer {GITHUB_TOKEN}'}
     params = {'ref': branch_name}
-    
+
     try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()  # Raise an error for bad responses
-        file_data = response.json()
-
-        if isinstance(file_data, dict) and 'download_url' in file_data:
-            file_response = requests.get(file_data['download_url'], headers=headers)
-            file_response.raise_for_status()  # Raise an error for bad responses
-            return file_response.text
-    except requests.exceptions.HTTPError as http_err:
+        return await gh_get(client, url, as_text=True, headers=RAW_HEADERS, params=params)
+    except httpx.HTTPStatusError as http_err:
         print(f"Failed to fetch {file_path} for repo: {repo_name}, branch: {branch_name} - HTTP error occurred: {http_err}")
-    except requests.exceptions.RequestException as req_err:
+    except httpx.HTTPError as req_err:
         print(f"Failed to fetch {file_path} for repo: {repo_name}, branch: {branch_name} - Request error occurred: {req_err}")
     except Exception as e:
         print(f"Failed to fetch {file_path} for repo: {repo_name}, branch: {branch_name} - Unexpected error: {e}")
-    
+
     return None
 
-def find_relevant_files(repo_name, branch_name):
-    """Find relevant files in a repository."""
+def is_pipeline_file(path):
+    """Check if a file path looks like a docker-compose or CI file."""
+    path_lower = path.lower()
+    return path_lower.endswith(PIPELINE_FILE_SUFFIXES) or any(hint in path_lower for hint in PIPELINE_DIR_HINTS)
+
+async def find_relevant_files(client, repo_name, branch_name, root_entries=None):
+    """Find relevant files in the repository root and in the pipeline directories."""
     relevant_files = []
-    url = f"{API_URL}/repos/{ORG_NAME}/{repo_name}/git/trees/{branch_name}?recursive=1"
-    headers = {'Authorization': f'bearer {GITHUB_TOKEN}'}
-    
+    tree_url = f"{API_URL}/repos/{ORG_NAME}/{repo_name}/git/trees"
+
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # Raise an error for bad responses
-        tree_data = response.json()
-
-        for item in tree_data.get('tree', []):
-            path = item['path']
-            if path.lower().endswith(('docker-compose.yml', 'docker-compose.yaml', '.gitlab-ci.yml', '.github/workflows', 'pipeline')):
-                relevant_files.append(path)
-                
-    except requests.exceptions.HTTPError as http_err:
+        # The root listing comes from the batched details query when available
+        if root_entries is None:
+            tree_data = await gh_get(client, f"{tree_url}/{branch_name}")
+            root_entries = [
+                {'name': item['path'], 'type': item['type'], 'oid': item['sha']} for item in tree_data.get('tree', [])
+            ]
+
+        pipeline_dirs = []
+        for entry in root_entries:
+            if entry['type'] == 'blob' and is_pipeline_file(entry['name']):
+                relevant_files.append(entry['name'])
+            elif entry['type'] == 'tree' and entry['name'].lower() in PIPELINE_ROOT_DIRS:
+                pipeline_dirs.append(entry)
+
+        # Only the pipeline directories are walked recursively, never the whole repository
+        subtrees = await asyncio.gather(
+            *(gh_get(client, f"{tree_url}/{entry['oid']}?recursive=1") for entry in pipeline_dirs)
+        )
+        for entry, subtree in zip(pipeline_dirs, subtrees):
+            for item in subtree.get('tree', []):
+                path = f"{entry['name']}/{item['path']}"
+                if item['type'] == 'blob' and is_pipeline_file(path):
+                    relevant_files.append(path)
+
+    except httpx.HTTPStatusError as http_err:
         print(f"Failed to fetch tree for repo: {repo_name}, branch: {branch_name} - HTTP error occurred: {http_err}")
-    except requests.exceptions.RequestException as req_err:
+    except httpx.HTTPError as req_err:
         print(f"Failed to fetch tree for repo: {repo_name}, branch: {branch_name} - Request error occurred: {req_err}")
     except Exception as e:
         print(f"Failed to fetch tree for repo: {repo_name}, branch: {branch_name} - Unexpected error: {e}")
@@ -163,75 +329,182 @@ def find_relevant_files(repo_name, branch_name):
 
 def process_relevant_files(repo_name, branch_name, file_content, file_path):
     """Process the content of docker-compose and CI files."""
-    docker_image_patterns = [
-        r'(?i)image:\s*([^\s]+)',
-        r'(?i)services:\s*-\s*name:\s*([^\s]+)',
-        r'(?i)repository:\s*([^\s]+)',
-        r'(?i)resource_types:\s*- name:\s*[^\n]+source:\s*repository:\s*([^\s]+)'
-    ]
-    
-    for pattern in docker_image_patterns:
-        matches = re.findall(pattern, file_content)
-        if matches:
-            for match in matches:
-                full_image_name, image_name = resolve_parameterized_image(match, {})
-                record_pipeline_image(repo_name, branch_name, image_name, full_image_name, file_path)
-
-def scan_repositories():
+    result = RepoResult()
+    for match in PIPELINE_RE.finditer(file_content):
+        image = resolve_parameterized_image(match[match.lastgroup], {})
+        record_pipeline_image(result, repo_name, branch_name, image, file_path)
+    return result
+
+async def scan_repositories(client):
     """Scan repositories in the GitHub organization and process Dockerfiles."""
-    if check_rate_limit() == 0:
+    if await check_rate_limit(client) == 0:
         return  # Exit if rate limit has been exceeded
 
     variables = {"orgName": ORG_NAME}
-    process_all_repositories(variables)
+    await process_all_repositories(client, variables)
 
-def process_all_repositories(variables):
+async def process_all_repositories(client, variables):
     """Process all repositories using pagination."""
     has_next_page = True
     after_cursor = None
 
     while has_next_page:
-        repositories, page_info = fetch_repositories(variables, after_cursor)
+        repositories, page_info = await fetch_repositories(client, variables, after_cursor)
         stats["total_repos"] += len(repositories)
 
-        process_each_repository(repositories)
+        await process_each_repository(client, repositories)
 
         has_next_page = page_info['hasNextPage']
         after_cursor = page_info['endCursor']
 
-        if check_rate_limit() == 0:
-            print("Rate limit reached. Exiting to wait for reset.")
+        if rate_limit_low():
+            print(f"Rate limit reached ({rate_limit_state['remaining']} calls remaining). Exiting to wait for reset.")
             break
 
-def fetch_repositories(variables, after_cursor):
+def rate_limit_low():
+    """Check the rate limit headers seen so far against RATE_LIMIT_THRESHOLD."""
+    return any(remaining < RATE_LIMIT_THRESHOLD for remaining in rate_limit_state["remaining"].values())
+
+async def fetch_repositories(client, variables, after_cursor):
     """Fetch repositories from the GitHub organization."""
     if after_cursor:
         variables['afterCursor'] = after_cursor
-    result = run_query(GRAPHQL_QUERY, variables)
+    result = await run_query(client, GRAPHQL_QUERY, variables)
     repositories = result['data']['organization']['repositories']['edges']
     page_info = result['data']['organization']['repositories']['pageInfo']
     return repositories, page_info
 
-def process_each_repository(repositories):
-    """Process each repository."""
+def build_repository_details_query(repo_names):
+    """Build one GraphQL query that aliases every repository in the batch as repoN."""
+    aliases = "\n".join(
+        f"repo{i}: repository(owner: {json.dumps(ORG_NAME)}, name: {json.dumps(name)}) {{ {REPO_DETAILS_FIELDS} }}"
+        for i, name in enumerate(repo_names)
+    )
+    return f"query {{ {aliases} }}"
+
+async def fetch_repository_batch(client, repo_names):
+    """Fetch the details of a batch of repositories, keyed by repository name."""
+    try:
+        result = await run_query(client, build_repository_details_query(repo_names), {})
+    except httpx.HTTPError as e:
+        print(f"Batched details query failed for {len(repo_names)} repos, falling back to REST: {e}")
+        return {}
+
+    # Repositories that errored come back as null and fall back to REST
+    data = result.get('data') or {}
+    return {name: data[f"repo{i}"] for i, name in enumerate(repo_names) if data.get(f"repo{i}")}
+
+async def fetch_repository_details(client, repo_names):
+    """Fetch Dockerfile text and root tree entries for repositories in batched GraphQL queries."""
+    batches = await asyncio.gather(
+        *(fetch_repository_batch(client, repo_names[i:i + REPOS_PER_QUERY])
+          for i in range(0, len(repo_names), REPOS_PER_QUERY))
+    )
+    repo_details = {}
+    for batch in batches:
+        repo_details.update(batch)
+    return repo_details
+
+async def process_each_repository(client, repositories):
+    """Process each repository concurrently."""
+    repo_names = [
+        repo['node']['name'] for repo in repositories
+        if not repo['node']['isArchived'] and get_default_branch(repo)
+    ]
+    repo_details = await fetch_repository_details(client, repo_names)
+    cache_contributors(repositories, repo_details)
+
+    tasks = [process_repository(client, repo, repo_details.get(repo['node']['name'])) for repo in repositories]
+    results = await asyncio.gather(*tasks)
+
+    await fetch_missing_contributors(client, results)
+    for result in results:
+        merge_repo_result(result)
+
+def merge_repo_result(result):
+    """Merge the images found in one repository into the run statistics and write them to the reports."""
+    stats["total_images"] += sum(result.image_counts.values())
+    stats["image_counts"].update(result.image_counts)
+    stats["compliant_counts"].update(result.compliant_counts)
+    build_pipeline_stats["total_pipeline_images"] += sum(result.pipeline_image_counts.values())
+    build_pipeline_stats["pipeline_image_counts"].update(result.pipeline_image_counts)
+
+    compliant_images(result.compliant)
+    non_compliant_images(result.non_compliant)
+    build_pipeline_images(result.pipeline)
+
+def cache_contributors(repositories, repo_details):
+    """Cache the top contributors from the commit history returned by the batched details query."""
     for repo in repositories:
-        repo_name = repo['node']['name']
-        if repo['node']['isArchived']:
-            print(f"Skipping archived repo: {repo_name}")
-            continue
-
-        branch_name = get_default_branch(repo)
-        if branch_name:
-            dockerfile_content = get_dockerfile_content(repo_name, branch_name)
-            if dockerfile_content:
-                process_dockerfiles(repo_name, branch_name, dockerfile_content)
-
-            # New block to find and process relevant files
-            relevant_files = find_relevant_files(repo_name, branch_name)
-            for file_path in relevant_files:
-                file_content = get_file_content(repo_name, branch_name, file_path)
-                if file_content:
-                    process_relevant_files(repo_name, branch_name, file_content, file_path)
+        details = repo_details.get(repo['node']['name'])
+        if details and details['defaultBranchRef']:
+            history = details['defaultBranchRef']['target']['history']['nodes']
+            contributors_cache[(repo['node']['name'], get_default_branch(repo))] = rank_contributors(
+                commit['author']['name'] for commit in history
+            )
+
+def rank_contributors(author_names):
+    """Return the five authors with the most commits."""
+    return [contributor for contributor, _ in Counter(author_names).most_common(5)]
+
+async def process_repository(client, repo, details):
+    """Process a single repository and return the images found in it."""
+    result = RepoResult()
+    repo_name = repo['node']['name']
+    if repo['node']['isArchived']:
+        print(f"Skipping archived repo: {repo_name}")
+        return result
+
+    branch_name = get_default_branch(repo)
+    if branch_name:
+        dockerfile_content, relevant_files = await asyncio.gather(
+            resolve_dockerfile_content(client, repo_name, branch_name, details),
+            find_relevant_files(client, repo_name, branch_name, get_root_entries(details))
+        )
+        # Parsing is CPU-bound, so it runs in parse_pool while other repositories keep fetching
+        loop = asyncio.get_running_loop()
+        parse_tasks = []
+        if dockerfile_content:
+            parse_tasks.append(loop.run_in_executor(
+                parse_pool, process_dockerfiles, repo_name, branch_name, dockerfile_content
+            ))
+
+        # New block to find and process relevant files
+        file_contents = await asyncio.gather(
+            *(get_file_content(client, repo_name, branch_name, file_path) for file_path in relevant_files)
+        )
+        for file_path, file_content in zip(relevant_files, file_contents):
+            if file_content:
+                parse_tasks.append(loop.run_in_executor(
+                    parse_pool, process_relevant_files, repo_name, branch_name, file_content, file_path
+                ))
+
+        for parsed in await asyncio.gather(*parse_tasks):
+            result.merge(parsed)
+
+    return result
+
+async def resolve_dockerfile_content(client, repo_name, branch_name, details):
+    """Get the Dockerfile content from the batched details, falling back to REST when needed."""
+    if details is None:
+        return await get_dockerfile_content(client, repo_name, branch_name)
+
+    dockerfile = details['dockerfile']
+    if dockerfile and dockerfile['text'] is not None:
+        return dockerfile['text']
+
+    # Only the exact "Dockerfile" path is batched; other spellings (e.g. Dockerfile.prod) go through REST
+    entries = (details['tree'] or {}).get('entries', [])
+    if any(entry['name'].lower().startswith('dockerfile') for entry in entries):
+        return await get_dockerfile_content(client, repo_name, branch_name)
+
+    return None
+
+def get_root_entries(details):
+    """Get the root tree entries from the batched details, or None when they must be fetched over REST."""
+    if details is None or details['tree'] is None:
+        return None
+    return details['tree']['entries']
 
 def get_default_branch(repo):
     """Get the default branch name of a repository."""
@@ -239,93 +512,100 @@ def get_default_branch(repo):
 
 def process_dockerfiles(repo_name, branch_name, dockerfile_content):
     """Process the Dockerfile content."""
+    result = RepoResult()
     if not dockerfile_content:
-        return
-    
-    args = extract_args(dockerfile_content)
-    from_matches = find_from_directives(dockerfile_content)
+        return result
+
+    # Collect ARG defaults and FROM images in a single pass over the Dockerfile
+    args = {}
+    from_matches = []
+    for match in DOCKERFILE_RE.finditer(dockerfile_content):
+        if match.group(3):
+            from_matches.append(match.group(3))
+        else:
+            args[match.group(1)] = match.group(2)
     recorded_images = set()
 
     if from_matches:
         for image_line in from_matches:
-            process_image_line(image_line, args, recorded_images, repo_name, branch_name, "Dockerfile")
+            process_image_line(result, image_line, args, recorded_images, repo_name, branch_name, "Dockerfile")
+    return result
 
-def process_image_line(image_line, args, recorded_images, repo_name, branch_name, file_path):
+def process_image_line(result, image_line, args, recorded_images, repo_name, branch_name, file_path):
     """Process each image line found in the Dockerfile or other relevant files."""
     if '--platform=$BUILDPLATFORM' in image_line:
         return
-    
-    full_image_name, image_name = resolve_parameterized_image(image_line, args)
 
-    if image_name in ['base', 'build', 'final', 'builder']:
-        process_multistage_images(image_name, recorded_images, repo_name, branch_name, full_image_name, file_path)
-    elif '${' not in full_image_name:
-        record_image(repo_name, branch_name, image_name, full_image_name, file_path)
+    image = resolve_parameterized_image(image_line, args)
+    _, image_name, tag = image
 
-def process_multistage_images(image_name, recorded_images, repo_name, branch_name, full_image_name, file_path):
+    if image_name in MULTISTAGE_NAMES:
+        process_multistage_images(result, image, recorded_images, repo_name, branch_name, file_path)
+    elif '${' not in image_name and '${' not in tag:
+        record_image(result, repo_name, branch_name, image, file_path)
+
+def process_multistage_images(result, image, recorded_images, repo_name, branch_name, file_path):
     """Process multistage build images."""
+    image_name = image[1]
     if image_name not in recorded_images:
         recorded_images.add(image_name)
-        record_image(repo_name, branch_name, image_name, full_image_name, file_path)
-
-def extract_args(dockerfile_content):
-    """Extract ARG directives from Dockerfile content."""
-    arg_pattern = re.compile(r'ARG\s+([A-Z_]+)=([^\s]+)')
-    return dict(arg_pattern.findall(dockerfile_content))
-
-def find_from_directives(dockerfile_content):
-    """Find FROM directives in Dockerfile content."""
-    from_pattern = re.compile(r'FROM\s+([^\s]+)')
-    return from_pattern.findall(dockerfile_content)
+        record_image(result, repo_name, branch_name, image, file_path)
 
 def resolve_parameterized_image(image_line, args):
-    """Resolve parameterized image names."""
+    """Resolve parameterized image names into a (registry_path, name, tag) tuple."""
+    # ARGs only matter for parameterized lines, so plain images share one cache entry regardless of the Dockerfile
+    args_key = tuple(sorted(args.items())) if '${' in image_line else ()
+    return _resolve_parameterized_image(image_line, args_key)
+
+@lru_cache(maxsize=4096)
+def _resolve_parameterized_image(image_line, args_key):
+    """Memoized body of resolve_parameterized_image, with the ARGs frozen into sorted (name, value) pairs."""
     if '${' in image_line:
-        for arg, value in args.items():
-            image_line = image_line.replace(f'${{{arg}}}', value)
-    full_image_name = image_line.split('/')[-1]
-    image_name = full_image_name.split(':')[0]
-    return full_image_name, image_name
-
-def record_image(repo_name, branch_name, image_name, full_image_name, file_path):
-    """Record the image as compliant or non-compliant."""
+        args = dict(args_key)
+        # Unknown ARGs are left as-is so the caller can skip the unresolved image
+        image_line = PARAM_RE.sub(lambda match: args.get(match.group(1), match.group(0)), image_line)
+    registry_path, _, full_image_name = image_line.rpartition('/')
+    image_name, _, tag = full_image_name.partition(':')
+    return registry_path, image_name, tag
+
+def format_image(image):
+    """Format a (registry_path, name, tag) image as the name:tag shown in the reports."""
+    _, image_name, tag = image
+    return f"{image_name}:{tag}" if tag else image_name
+
+def record_image(result, repo_name, branch_name, image, file_path):
+    """Record the image in the repository result as compliant or non-compliant."""
+    _, image_name, tag = image
+    full_image_name = format_image(image)
+
     # Skip images with the tag "local"
-    if ":local" in full_image_name:
+    if tag.startswith('local'):
         print(f"Skipping image {full_image_name} as it contains the 'local' tag.")
         return
 
-    stats["total_images"] += 1
-    stats["image_counts"][image_name] += 1
+    result.image_counts[image_name] += 1
 
     # Skip certain non-compliant image names
-    if image_name in ['base', 'final', 'builder', 'amd64', 'arm64']:
+    if image_name in SKIP_NAMES:
         print(f"Skipping image {full_image_name} as it is categorized as a non-compliant placeholder.")
         return
 
-    if is_compliant(image_name):
-        compliant = '', 
-        if image_name in COMPLIANT_IMAGES:
-            stats["compliant_counts"][image_name] += 1
-            compliant = 'X'
-
-        compliant_images_data.append([repo_name, branch_name, full_image_name, compliant])
+    if image_name in COMPLIANT_IMAGES:
+        result.compliant_counts[image_name] += 1
+        result.compliant.append([repo_name, branch_name, full_image_name, 'X'])
         print(f"Repo: {repo_name}, Branch: {branch_name}, Image: {image_name}, Full Image: {full_image_name}")
     else:
         print(f"Repo: {repo_name}, Branch: {branch_name}, Image: {full_image_name} is non-compliant.")
-        non_compliant_images_data.append([repo_name, branch_name, full_image_name, file_path])
-
-def record_pipeline_image(repo_name, branch_name, image_name, full_image_name, file_path):
-    """Record the image found in build pipelines."""
-    build_pipeline_stats["total_pipeline_images"] += 1
-    build_pipeline_stats["pipeline_image_counts"][image_name] += 1
-    build_pipeline_images_data.append([repo_name, branch_name, full_image_name, file_path])
+        result.non_compliant.append([repo_name, branch_name, full_image_name, file_path])
+
+def record_pipeline_image(result, repo_name, branch_name, image, file_path):
+    """Record the image found in build pipelines in the repository result."""
+    image_name = image[1]
+    full_image_name = format_image(image)
+    result.pipeline_image_counts[image_name] += 1
+    result.pipeline.append([repo_name, branch_name, full_image_name, file_path])
     print(f"Repo: {repo_name}, Branch: {branch_name}, Pipeline Image: {image_name}, Full Image: {full_image_name}, File: {file_path}")
 
-def is_compliant(image_name):
-    """Check if the image is compliant."""
-    resolved_image_name = image_name.split(':')[0]  # Get base image name without tag
-    return (resolved_image_name in COMPLIANT_IMAGES)
-
 def print_information():
     total_repos = stats["total_repos"]
     total_images = stats["total_images"]
@@ -375,72 +655,74 @@ def print_compliant_image_statistics(total, label, compliant_counts):
             percentage = (count / total) * 100 if total > 0 else 0
             print(f"{image}: {count} ({percentage:.2f}%)")
 
-def compliant_images():
-    """Create a CSV with compliant images and their corresponding categories."""
-    with open('compliant_images.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Repo name", "Repo branch", "Image name"])
-        writer.writerows(compliant_images_data)
-    print("Compliant images CSV generated: compliant_images.csv")
-
-def non_compliant_images():
-    """Create a CSV with non-compliant images including top contributors and image path."""
-    updated_non_compliant_images_data = []
-
-    for i in range(len(non_compliant_images_data)):
-        repo_name, branch_name, image_name = non_compliant_images_data[i][:3]
-        image_path = non_compliant_images_data[i][3]  # Retrieve the image path
-        
-        top_contribs = top_contributors(repo_name, branch_name)
-        top_contribs_str = ', '.join(top_contribs)  
-
-        updated_row = [repo_name, branch_name, image_name, top_contribs_str, image_path]  
-        updated_non_compliant_images_data.append(updated_row)
-
-    with open('non_compliant_images.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Repo name", "Repo branch", "Image name", "Top Contributors", "Image path"])
-        writer.writerows(updated_non_compliant_images_data)
-
-    print("Non-compliant images CSV generated: non_compliant_images.csv")
-
-def build_pipeline_images():
-    """Create a CSV with images found in build pipelines."""
-    with open('build_pipeline_images.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Repo name", "Repo branch", "Image name", "File path"])
-        writer.writerows(build_pipeline_images_data)
-    print("Build pipeline images CSV generated: build_pipeline_images.csv")
+def open_reports(stack):
+    """Open the report CSVs on the given exit stack and write their headers."""
+    for key, (_, path, header) in REPORTS.items():
+        file = stack.enter_context(open(path, mode='w', newline='', buffering=REPORT_BUFFER_SIZE))
+        report_writers[key] = csv.writer(file)
+        report_writers[key].writerow(header)
+
+def compliant_images(rows):
+    """Append compliant images to the compliant images CSV."""
+    report_writers["compliant"].writerows(rows)
+
+def non_compliant_images(rows):
+    """Append non-compliant images, including top contributors and image path, to the non-compliant images CSV."""
+    report_writers["non_compliant"].writerows(
+        [repo_name, branch_name, image_name, ', '.join(top_contributors(repo_name, branch_name)), image_path]
+        for repo_name, branch_name, image_name, image_path in rows
+    )
+
+def build_pipeline_images(rows):
+    """Append images found in build pipelines to the build pipeline images CSV."""
+    report_writers["pipeline"].writerows(rows)
 
 def top_contributors(repo_name, branch_name):
-    """Get the top 5 contributors sorted by recent activity and most commits for a given repo."""
+    """Get the top 5 contributors for a given repo from the contributors cache."""
+    return contributors_cache.get((repo_name, branch_name), [])
+
+async def fetch_missing_contributors(client, results):
+    """Fetch contributors over REST for repos with non-compliant images that the batched query missed."""
+    uncached = {
+        (repo_name, branch_name)
+        for result in results
+        for repo_name, branch_name, *_ in result.non_compliant
+    } - contributors_cache.keys()
+    await asyncio.gather(*(fetch_top_contributors(client, repo_name, branch_name) for repo_name, branch_name in uncached))
+
+async def fetch_top_contributors(client, repo_name, branch_name):
+    """Fetch the top 5 contributors sorted by recent activity and most commits into the contributors cache."""
     url = f"{API_URL}/repos/{ORG_NAME}/{repo_name}/commits"
-    headers = {'Authorization': f'bearer {GITHUB_TOKEN}'}
     params = {'sha': branch_name, 'per_page': 100}
 
     try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
+        commits = await gh_get(client, url, params=params)
+        contributors_cache[(repo_name, branch_name)] = rank_contributors(
+            commit['commit']['author']['name'] for commit in commits
+        )
 
-        commits = response.json()
-        contributor_counts = defaultdict(int)
-
-        for commit in commits:
-            author = commit['commit']['author']['name']
-            contributor_counts[author] += 1
-
-        sorted_contributors = sorted(contributor_counts.items(), key=lambda x: (-x[1], x[0]))
-
-        return [contributor for contributor, _ in sorted_contributors[:5]]
-
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching top contributors for repo: {repo_name}, branch: {branch_name} - {e}")
-        return []
+        contributors_cache[(repo_name, branch_name)] = []
+
+async def main():
+    """Scan the organization and generate the reports."""
+    global etag_cache, parse_pool
+
+    limits = httpx.Limits(max_connections=64, max_keepalive_connections=64)
+    async with AsyncExitStack() as stack:
+        etag_cache = stack.enter_context(shelve.open(ETAG_CACHE_PATH))
+        parse_pool = stack.enter_context(ProcessPoolExecutor(max_workers=os.cpu_count()))
+        open_reports(stack)
+        client = await stack.enter_async_context(
+            httpx.AsyncClient(http2=True, limits=limits, headers=HEADERS, timeout=REQUEST_TIMEOUT, follow_redirects=True)
+        )
+        await scan_repositories(client)
 
-if __name__ == "__main__":
-    scan_repositories()
     print_information()
     print_pipeline_information()
-    compliant_images()  
-    non_compliant_images()
-    build_pipeline_images()
+    for label, path, _ in REPORTS.values():
+        print(f"{label} CSV generated: {path}")
+
+if __name__ == "__main__":
+    asyncio.run(main())